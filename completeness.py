@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Cálculo de completude das medidas de 5 minutos.
+
+Monta, para um dia, a matriz de presença device × slot de 5 minutos e deriva
+dela a completude por device e as janelas de slots ausentes. Tudo é feito
+com operações vetorizadas (NumPy), sem laços por linha.
+"""
+
+import numpy as np
+import pandas as pd
+
+SLOT_MINUTES = 5
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+
+def presence_matrix(timestamps, devices, day, expected_devices):
+    """
+    Retorna matriz booleana (len(expected_devices) × SLOTS_PER_DAY).
+
+    timestamps/devices são as chaves (timestamp, device) gravadas no dia;
+    devices fora de expected_devices são ignorados.
+    """
+    rows, slots, valid = _locate(timestamps, devices, day, expected_devices)
+    present = np.zeros((len(expected_devices), SLOTS_PER_DAY), dtype=bool)
+    present[rows[valid], slots[valid]] = True
+    return present
+
+def lookup(matrix, timestamps, devices, day, expected_devices):
+    """Para cada linha (timestamp, device), o valor da matriz na célula correspondente."""
+    rows, slots, valid = _locate(timestamps, devices, day, expected_devices)
+    values = np.zeros(len(rows), dtype=bool)
+    values[valid] = matrix[rows[valid], slots[valid]]
+    return values
+
+def _locate(timestamps, devices, day, expected_devices):
+    """Índices (linha do device, slot) de cada chave e máscara das que caem na matriz."""
+    rows = pd.Index(expected_devices).get_indexer(pd.Index(devices))
+    offsets = pd.to_datetime(pd.Series(timestamps)) - pd.Timestamp(day)
+    slots = (offsets // pd.Timedelta(minutes=SLOT_MINUTES)).to_numpy()
+    valid = (rows >= 0) & (slots >= 0) & (slots < SLOTS_PER_DAY)
+    return rows, slots, valid
+
+def expected_slots(present):
+    """
+    Slots esperados: da mediana do primeiro à mediana do último slot com
+    dado dos devices que reportaram.
+
+    Exclui a noite (sem geração, sem dados) e ainda detecta quedas da API
+    que atinjam a frota inteira durante o dia. Com a mediana, um device que
+    reporta a noite toda não torna a noite esperada para os demais.
+    """
+    reporting = present[present.any(axis=1)]
+    expected = np.zeros(SLOTS_PER_DAY, dtype=bool)
+    if len(reporting):
+        first = reporting.argmax(axis=1)
+        last = SLOTS_PER_DAY - 1 - reporting[:, ::-1].argmax(axis=1)
+        expected[int(np.floor(np.median(first))):int(np.ceil(np.median(last))) + 1] = True
+    return expected
+
+def missing_windows(missing):
+    """Converte um vetor booleano de slots ausentes em janelas [início, fim] (inclusivas)."""
+    padded = np.concatenate(([0], missing.astype(np.int8), [0]))
+    edges = np.flatnonzero(np.diff(padded))
+    return list(zip(edges[::2].tolist(), (edges[1::2] - 1).tolist()))
+
+def merge_windows(windows, max_gap=0):
+    """Une janelas separadas por até max_gap slots, reduzindo o número de buscas."""
+    merged = []
+    for start, end in sorted(windows):
+        if merged and start - merged[-1][1] - 1 <= max_gap:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [tuple(window) for window in merged]
+
+def window_matrix(windows, day):
+    """
+    Matriz booleana (len(windows) × SLOTS_PER_DAY) a partir das janelas
+    [início, fim] de cada device, no formato gravado por summarize.
+    """
+    matrix = np.zeros((len(windows), SLOTS_PER_DAY), dtype=bool)
+    step = pd.Timedelta(minutes=SLOT_MINUTES)
+    for row, device_windows in enumerate(windows):
+        for start, end in device_windows or []:
+            first = max(0, (pd.Timestamp(start) - pd.Timestamp(day)) // step)
+            last = min(SLOTS_PER_DAY - 1, (pd.Timestamp(end) - pd.Timestamp(day)) // step)
+            matrix[row, first:last + 1] = True
+    return matrix
+
+def slot_time(day, slot):
+    """Timestamp do início de um slot."""
+    return pd.Timestamp(day) + pd.Timedelta(minutes=SLOT_MINUTES * int(slot))
+
+def summarize(present, expected_devices, day):
+    """
+    Completude por device: slots esperados/presentes, percentual e janelas ausentes.
+
+    Retorna um DataFrame com uma linha por device.
+    """
+    expected = expected_slots(present)
+    missing = ~present & expected
+
+    expected_count = int(expected.sum())
+    present_count = (present & expected).sum(axis=1)
+    completeness = present_count / expected_count * 100 if expected_count else np.full(len(expected_devices), 100.0)
+
+    windows = [
+        [[slot_time(day, start).strftime('%Y-%m-%d %H:%M:%S'), slot_time(day, end).strftime('%Y-%m-%d %H:%M:%S')]
+         for start, end in missing_windows(row)]
+        for row in missing
+    ]
+
+    return pd.DataFrame({
+        'device': list(expected_devices),
+        'expected_slots': expected_count,
+        'present_slots': present_count.astype(int),
+        'completeness': np.round(completeness, 2),
+        'missing_windows': windows,
+    })
@@ -2,12 +2,19 @@
 """
 Script de backup diário do Supabase.
 
-Executa pg_dump do banco PostgreSQL local (já comprimido internamente).
+Executa pg_dump do banco PostgreSQL local (já comprimido internamente) e grava
+um manifesto com a contagem de linhas e o timestamp máximo de cada tabela,
+usado por db_restore.py para verificar a restauração. O dump e as contagens
+usam o mesmo snapshot (pg_export_snapshot), então o manifesto descreve
+exatamente o conteúdo do backup.
 """
 
 import os
+import json
 import logging
 import sys
+import time
+import tempfile
 import subprocess
 from datetime import datetime
 from dotenv import load_dotenv
@@ -36,14 +43,28 @@ DB_PASSWORD = os.getenv('DB_PASSWORD', 'your_password')
 # Diretório de backups
 BACKUP_DIR = os.getenv('BACKUP_DIR', './backups')
 
+# Tabelas verificadas na restauração e sua coluna de tempo (None = apenas contagem)
+MANIFEST_TABLES = {
+    'power_stations': None,
+    'devices': None,
+    'inverter_measures': 'timestamp',
+    'combiner_measures': 'timestamp',
+    'inverter_measures_hourly': 'timestamp',
+    'combiner_measures_hourly': 'timestamp',
+    'yield_daily': 'date',
+    'fault_alarms': 'timestamp',
+    'data_completeness': 'date',
+    'string_analytics_daily': 'date',
+}
+
 def create_backup_dir():
     """Cria diretório de backups se não existir."""
     if not os.path.exists(BACKUP_DIR):
         os.makedirs(BACKUP_DIR)
         logger.info(f"Diretório de backup criado: {BACKUP_DIR}")
 
-def run_pg_dump(filename):
-    """Executa pg_dump para criar backup."""
+def run_pg_dump(filename, snapshot_id):
+    """Executa pg_dump para criar backup, no snapshot exportado por open_snapshot()."""
     logger.info(f"Iniciando backup: {filename}")
 
     # Comando pg_dump
@@ -57,6 +78,7 @@ def run_pg_dump(filename):
         '--compress=9',     # Máxima compressão
         '--no-owner',       # Não incluir ownership
         '--no-privileges',  # Não incluir privilégios
+        f'--snapshot={snapshot_id}',
         '--file', filename
     ]
 
@@ -83,6 +105,101 @@ def run_pg_dump(filename):
 
 
 
+def psql_command():
+    """Comando psql contra o banco de produção, com saída sem formatação."""
+    return [
+        '/usr/bin/psql',
+        f'--host={DB_HOST}',
+        f'--port={DB_PORT}',
+        f'--username={DB_USER}',
+        f'--dbname={DB_NAME}',
+        '--no-psqlrc', '--no-align', '--tuples-only', '--field-separator=|',
+        '--set=ON_ERROR_STOP=1',
+    ]
+
+def stats_query(table_name, time_column):
+    """Consulta (tabela, contagem, máximo da coluna de tempo) de uma tabela."""
+    max_expr = f'max("{time_column}")::text' if time_column else 'NULL'
+    return f"SELECT '{table_name}', count(*), {max_expr} FROM public.{table_name};"
+
+def open_snapshot(work_dir, timeout=60):
+    """
+    Abre uma transação REPEATABLE READ, exporta seu snapshot e enfileira nela
+    a contagem e o timestamp máximo de cada tabela do manifesto.
+
+    A transação fica aberta até finish_snapshot(), para que o pg_dump use o
+    mesmo snapshot. Retorna (processo psql, id do snapshot) ou None.
+    """
+    logger.info("Exportando snapshot e gerando manifesto do backup...")
+    snapshot_file = os.path.join(work_dir, 'snapshot')
+    stats_file = os.path.join(work_dir, 'stats')
+
+    stats_queries = '\n'.join(stats_query(table_name, time_column)
+                              for table_name, time_column in MANIFEST_TABLES.items())
+    script = (
+        "BEGIN ISOLATION LEVEL REPEATABLE READ, READ ONLY;\n"
+        f"\\o '{snapshot_file}'\nSELECT pg_export_snapshot();\n\\o\n"
+        f"\\o '{stats_file}'\n{stats_queries}\n\\o\n"
+    )
+
+    env = os.environ.copy()
+    env['PGPASSWORD'] = DB_PASSWORD
+    process = subprocess.Popen(psql_command(), env=env, text=True, stdin=subprocess.PIPE,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    process.stdin.write(script)
+    process.stdin.flush()
+
+    # O psql grava o arquivo ao fechar o \o; o id fica disponível logo após a exportação
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and process.poll() is None:
+        if os.path.exists(snapshot_file):
+            with open(snapshot_file) as f:
+                content = f.read()
+            if content.endswith('\n'):
+                return process, content.strip()
+        time.sleep(0.2)
+
+    process.kill()
+    logger.error(f"Falha ao exportar snapshot: {process.communicate()[1]}")
+    return None
+
+def finish_snapshot(process, work_dir, timeout=1800):
+    """
+    Encerra a transação do snapshot após aguardar as contagens.
+
+    Retorna {tabela: {time_column, rows, max}} ou None em caso de falha.
+    """
+    try:
+        _, stderr = process.communicate('COMMIT;\n', timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        logger.error("Timeout nas contagens do manifesto")
+        return None
+    if process.returncode != 0:
+        logger.error(f"Falha nas contagens do manifesto: {stderr}")
+        return None
+
+    tables = {}
+    with open(os.path.join(work_dir, 'stats')) as f:
+        for line in f.read().splitlines():
+            table_name, count, max_value = line.split('|')
+            tables[table_name] = {'time_column': MANIFEST_TABLES[table_name],
+                                  'rows': int(count), 'max': max_value or None}
+    return tables
+
+def write_manifest(filename, tables):
+    """Grava {backup}.manifest.json com contagem e timestamp máximo por tabela."""
+    try:
+        with open(filename + '.manifest.json', 'w') as f:
+            json.dump({'created_at': datetime.now().isoformat(), 'tables': tables}, f, indent=2)
+
+        logger.info(f"Manifesto salvo: {os.path.basename(filename)}.manifest.json")
+        return True
+
+    except Exception as e:
+        logger.error(f"Erro ao gerar manifesto: {e}")
+        return False
+
 def cleanup_old_backups():
     """Remove backups antigos (mantém últimos 30 dias)."""
     logger.info("Limpando backups antigos...")
@@ -100,6 +217,8 @@ def cleanup_old_backups():
 
         for file_path in files_to_remove:
             os.remove(file_path)
+            if os.path.exists(file_path + '.manifest.json'):
+                os.remove(file_path + '.manifest.json')
             logger.info(f"Backup antigo removido: {os.path.basename(file_path)}")
 
         logger.info(f"Limpeza concluída. {len(files_to_remove)} arquivos removidos.")
@@ -129,15 +248,27 @@ def main():
 
     success = False
 
-    # 1. Executar pg_dump
-    if run_pg_dump(backup_file):
-        size_mb = get_backup_size(backup_file)
-        logger.info(f"Backup concluído: {os.path.basename(backup_file)} ({size_mb} MB)")
-        success = True
-    else:
+    with tempfile.TemporaryDirectory() as work_dir:
+        # 1. Exportar snapshot e contar as tabelas nele (para a verificação da restauração)
+        snapshot = open_snapshot(work_dir)
+
+        if snapshot is not None:
+            process, snapshot_id = snapshot
+
+            # 2. Executar pg_dump no mesmo snapshot
+            dumped = run_pg_dump(backup_file, snapshot_id)
+            tables = finish_snapshot(process, work_dir)
+
+            # 3. Gravar o manifesto apenas para um backup completo
+            if dumped and tables is not None and write_manifest(backup_file, tables):
+                size_mb = get_backup_size(backup_file)
+                logger.info(f"Backup concluído: {os.path.basename(backup_file)} ({size_mb} MB)")
+                success = True
+
+    if not success:
         logger.error("Falha na criação do backup")
 
-    # 2. Limpar backups antigos
+    # 4. Limpar backups antigos
     cleanup_old_backups()
 
     logger.info("=== Backup concluído ===")
@@ -81,7 +81,8 @@ def main():
     """Função principal de manutenção."""
     logger.info("=== Iniciando manutenção semanal do DB ===")
 
-    tables = ['inverter_measures', 'combiner_measures', 'yield_daily', 'devices', 'power_stations']
+    tables = ['inverter_measures', 'combiner_measures', 'inverter_measures_hourly', 'combiner_measures_hourly',
+              'yield_daily', 'fault_alarms', 'string_analytics_daily', 'devices', 'power_stations']
 
     success_count = 0
     total_operations = len(tables) * 3  # stats + reindex + analyze por tabela
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Script de verificação de restauração dos backups.
+
+Executa:
+1. pg_restore --jobs=N do backup mais recente em um PostgreSQL local de teste
+2. Verificação da contagem de linhas e do timestamp máximo de cada tabela
+   contra o manifesto gravado por db_backup.py
+3. Registro da duração e da vazão da restauração (RTO medido) em CSV
+"""
+
+import os
+import csv
+import glob
+import json
+import logging
+import sys
+import time
+import argparse
+import subprocess
+from datetime import datetime
+from dotenv import load_dotenv
+
+# Configuração de logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('restore.log'),
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger(__name__)
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+# PostgreSQL de teste (descartável) onde o backup é restaurado
+RESTORE_DB_HOST = os.getenv('RESTORE_DB_HOST', 'localhost')
+RESTORE_DB_PORT = os.getenv('RESTORE_DB_PORT', '5433')
+RESTORE_DB_NAME = os.getenv('RESTORE_DB_NAME', 'restore_check')
+RESTORE_DB_USER = os.getenv('RESTORE_DB_USER', 'postgres')
+RESTORE_DB_PASSWORD = os.getenv('RESTORE_DB_PASSWORD', 'your_password')
+
+# Processos paralelos do pg_restore e RTO máximo aceito
+RESTORE_JOBS = int(os.getenv('RESTORE_JOBS', str(os.cpu_count() or 2)))
+RESTORE_RTO_MINUTES = float(os.getenv('RESTORE_RTO_MINUTES', '60'))
+
+# Diretório de backups e histórico das restaurações
+BACKUP_DIR = os.getenv('BACKUP_DIR', './backups')
+BENCHMARK_FILE = os.path.join(BACKUP_DIR, 'restore_benchmarks.csv')
+
+def run_pg_command(cmd, timeout=3600):
+    """Executa um comando do PostgreSQL contra o banco de teste."""
+    env = os.environ.copy()
+    env['PGPASSWORD'] = RESTORE_DB_PASSWORD
+    return subprocess.run(cmd, env=env, capture_output=True, text=True, timeout=timeout)
+
+def connection_args(dbname):
+    """Parâmetros de conexão com o PostgreSQL de teste."""
+    return [
+        f'--host={RESTORE_DB_HOST}',
+        f'--port={RESTORE_DB_PORT}',
+        f'--username={RESTORE_DB_USER}',
+        f'--dbname={dbname}',
+    ]
+
+def find_latest_backup():
+    """Retorna o backup mais recente do diretório (ou None)."""
+    backup_files = glob.glob(os.path.join(BACKUP_DIR, 'backup_*.sql'))
+    if not backup_files:
+        return None
+    return max(backup_files, key=os.path.getctime)
+
+def recreate_scratch_db():
+    """Apaga e recria o banco de teste."""
+    logger.info(f"Recriando banco de teste {RESTORE_DB_NAME} em {RESTORE_DB_HOST}:{RESTORE_DB_PORT}")
+
+    for statement in [f'DROP DATABASE IF EXISTS {RESTORE_DB_NAME};', f'CREATE DATABASE {RESTORE_DB_NAME};']:
+        result = run_pg_command(['/usr/bin/psql'] + connection_args('postgres') + ['--command', statement], timeout=600)
+        if result.returncode != 0:
+            logger.error(f"Falha ao recriar banco de teste: {result.stderr}")
+            return False
+    return True
+
+def run_pg_restore(filename):
+    """Executa pg_restore paralelo; retorna a duração em segundos (ou None)."""
+    logger.info(f"Restaurando {os.path.basename(filename)} com {RESTORE_JOBS} jobs...")
+
+    cmd = ['/usr/bin/pg_restore'] + connection_args(RESTORE_DB_NAME) + [
+        f'--jobs={RESTORE_JOBS}',
+        '--schema=public',   # Apenas os dados do projeto (schemas internos do Supabase ficam de fora)
+        '--no-owner',
+        '--no-privileges',
+        filename
+    ]
+
+    started = time.monotonic()
+    try:
+        result = run_pg_command(cmd)
+    except subprocess.TimeoutExpired:
+        logger.error("Timeout no pg_restore")
+        return None
+    duration = time.monotonic() - started
+
+    # pg_restore retorna erro também para avisos ignorados (ex.: extensões do
+    # Supabase); a verificação das tabelas decide se a restauração é válida
+    if result.returncode != 0:
+        logger.warning(f"pg_restore terminou com avisos: {result.stderr.strip()[-2000:]}")
+
+    logger.info(f"pg_restore concluído em {duration:.1f} s")
+    return duration
+
+def query_restored_stats(table_name, time_column):
+    """Retorna (contagem, máximo da coluna de tempo) de uma tabela restaurada."""
+    max_expr = f'max("{time_column}")::text' if time_column else 'NULL'
+    result = run_pg_command(['/usr/bin/psql'] + connection_args(RESTORE_DB_NAME) + [
+        '--no-align', '--tuples-only', '--field-separator=|',
+        '--command', f'SELECT count(*), {max_expr} FROM public.{table_name};'
+    ], timeout=600)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip())
+
+    count, max_value = result.stdout.strip().split('|')
+    return int(count), max_value or None
+
+def verify_restore(manifest):
+    """
+    Compara contagem e timestamp máximo de cada tabela com o manifesto.
+
+    O manifesto é contado no mesmo snapshot do pg_dump, então a restauração
+    precisa ter exatamente as mesmas linhas e o mesmo timestamp máximo.
+    Retorna (sucesso, total de linhas restauradas).
+    """
+    success = True
+    total_rows = 0
+
+    for table_name, expected in manifest['tables'].items():
+        try:
+            count, max_value = query_restored_stats(table_name, expected['time_column'])
+        except Exception as e:
+            logger.error(f"✗ {table_name}: erro ao consultar tabela restaurada: {e}")
+            success = False
+            continue
+
+        total_rows += count
+        if count != expected['rows'] or max_value != expected['max']:
+            logger.error(f"✗ {table_name}: restaurado {count} linhas (máx {max_value}), "
+                         f"esperado {expected['rows']} (máx {expected['max']})")
+            success = False
+        else:
+            logger.info(f"✓ {table_name}: {count} linhas, máx {max_value}")
+
+    return success, total_rows
+
+def record_benchmark(filename, duration, total_rows, verified):
+    """Acrescenta a medição da restauração ao histórico em CSV."""
+    size_mb = os.path.getsize(filename) / (1024 * 1024)
+    row = {
+        'restored_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'backup_file': os.path.basename(filename),
+        'backup_size_mb': round(size_mb, 2),
+        'jobs': RESTORE_JOBS,
+        'duration_s': round(duration, 1),
+        'mb_per_s': round(size_mb / duration, 2) if duration else None,
+        'rows': total_rows,
+        'rows_per_s': round(total_rows / duration) if duration else None,
+        'verified': verified,
+    }
+
+    new_file = not os.path.exists(BENCHMARK_FILE)
+    with open(BENCHMARK_FILE, 'a', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(row))
+        if new_file:
+            writer.writeheader()
+        writer.writerow(row)
+
+    logger.info(f"Restauração: {row['duration_s']} s, {row['mb_per_s']} MB/s, {row['rows_per_s']} linhas/s")
+
+def main(filename=None):
+    """Função principal de verificação de restauração."""
+    logger.info("=== Iniciando verificação de restauração ===")
+
+    filename = filename or find_latest_backup()
+    if not filename:
+        logger.error(f"Nenhum backup encontrado em {BACKUP_DIR}")
+        return False
+
+    manifest_file = filename + '.manifest.json'
+    if not os.path.exists(manifest_file):
+        logger.error(f"Manifesto não encontrado: {manifest_file}")
+        return False
+    with open(manifest_file) as f:
+        manifest = json.load(f)
+
+    # 1. Restaurar no banco de teste
+    if not recreate_scratch_db():
+        return False
+    duration = run_pg_restore(filename)
+    if duration is None:
+        return False
+
+    # 2. Verificar tabelas
+    verified, total_rows = verify_restore(manifest)
+
+    # 3. Registrar RTO medido
+    record_benchmark(filename, duration, total_rows, verified)
+
+    within_rto = duration <= RESTORE_RTO_MINUTES * 60
+    if not within_rto:
+        logger.error(f"Restauração levou {duration / 60:.1f} min, acima do RTO de {RESTORE_RTO_MINUTES} min")
+
+    # Liberar espaço do banco de teste
+    run_pg_command(['/usr/bin/psql'] + connection_args('postgres') +
+                   ['--command', f'DROP DATABASE IF EXISTS {RESTORE_DB_NAME};'], timeout=600)
+
+    logger.info(f"=== Verificação concluída: {'OK' if verified and within_rto else 'FALHA'} ===")
+
+    return verified and within_rto
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Restaura e verifica um backup do Supabase')
+    parser.add_argument('--file', help='Arquivo de backup (padrão: o mais recente em BACKUP_DIR)')
+    args = parser.parse_args()
+
+    success = main(args.file)
+    sys.exit(0 if success else 1)
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Script de retenção mensal das medidas de 5 minutos.
+
+Executa, para inverter_measures e combiner_measures:
+1. Arquivamento dos meses mais antigos que RETENTION_MONTHS em CSV comprimido
+   (COPY direto do PostgreSQL, sem passar pela API REST)
+2. Verificação da contagem de linhas do arquivo
+3. Gravação dos agregados horários (tabelas *_hourly) e remoção dos dados
+   brutos arquivados, em uma única transação no banco
+
+A função read_measures() lê um intervalo combinando arquivo e banco, de forma
+transparente para quem consulta períodos antigos. Nenhum script do projeto a
+usa: é uma API opcional para consultas manuais e análises.
+"""
+
+import os
+import gzip
+import shutil
+import logging
+import sys
+import subprocess
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+import pandas as pd
+from supabase import create_client, Client
+
+# Configuração de logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('retention.log'),
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger(__name__)
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+# Credenciais Supabase
+SUPABASE_URL = os.getenv('SUPABASE_URL', 'your_supabase_url')
+SUPABASE_KEY = os.getenv('SUPABASE_ANON_KEY', 'your_supabase_anon_key')
+
+# Configurações do PostgreSQL (as mesmas do db_backup.py)
+DB_HOST = os.getenv('DB_HOST', '11.1.1.79')
+DB_PORT = os.getenv('DB_PORT', '5432')
+DB_NAME = os.getenv('DB_NAME', 'postgres')
+DB_USER = os.getenv('DB_USER', 'postgres.supabase_id')
+DB_PASSWORD = os.getenv('DB_PASSWORD', 'your_password')
+
+# Meses de dados brutos mantidos online e diretório dos arquivos
+RETENTION_MONTHS = int(os.getenv('RETENTION_MONTHS', '24'))
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', './archive')
+ARCHIVE_CHUNK_ROWS = 100000  # Linhas por bloco ao ler os arquivos
+
+RETENTION_TABLES = ['inverter_measures', 'combiner_measures']
+
+# Inicializar cliente Supabase
+supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+def psql_command(*args):
+    """Comando psql contra o banco de produção; interrompe no primeiro erro."""
+    return [
+        '/usr/bin/psql',
+        f'--host={DB_HOST}',
+        f'--port={DB_PORT}',
+        f'--username={DB_USER}',
+        f'--dbname={DB_NAME}',
+        '--no-psqlrc', '--quiet', '--set=ON_ERROR_STOP=1',
+    ] + list(args)
+
+def psql_env():
+    """Ambiente com a senha do banco para o psql."""
+    env = os.environ.copy()
+    env['PGPASSWORD'] = DB_PASSWORD
+    return env
+
+def month_filter(month, next_month):
+    """Condição SQL do intervalo de um mês."""
+    return f""""timestamp" >= '{month}' AND "timestamp" < '{next_month}'"""
+
+def get_cutoff():
+    """Primeiro dia do mês mais antigo mantido online."""
+    today = pd.Timestamp(datetime.now().date())
+    return (today - pd.DateOffset(months=RETENTION_MONTHS)).replace(day=1)
+
+def archive_path(table_name, month):
+    """Caminho do arquivo de um mês (ex.: archive/inverter_measures/inverter_measures_2023-01.csv.gz)."""
+    return os.path.join(ARCHIVE_DIR, table_name, f"{table_name}_{month.strftime('%Y-%m')}.csv.gz")
+
+def fetch_range(table_name, start, end, columns='*', page_size=1000):
+    """
+    Lê as linhas com start <= timestamp < end pela API.
+
+    Pagina pela chave (timestamp, device) a partir da última linha lida, de
+    modo que cada página custa o mesmo independente da posição no intervalo.
+    """
+    rows = []
+    while True:
+        query = (supabase.table(table_name).select(columns)
+                 .gte('timestamp', str(start)).lt('timestamp', str(end)))
+        if rows:
+            last_timestamp, last_device = rows[-1]['timestamp'], rows[-1]['device']
+            query = query.or_(f'timestamp.gt."{last_timestamp}",'
+                              f'and(timestamp.eq."{last_timestamp}",device.gt."{last_device}")')
+        result = query.order('timestamp').order('device').limit(page_size).execute()
+        rows.extend(result.data)
+        if len(result.data) < page_size:
+            return pd.DataFrame(rows)
+
+def get_oldest_month(table_name):
+    """Retorna o mês do registro mais antigo da tabela (ou None se vazia)."""
+    result = supabase.table(table_name).select('timestamp').order('timestamp').limit(1).execute()
+    if not result.data:
+        return None
+    return pd.Timestamp(result.data[0]['timestamp']).replace(day=1).normalize()
+
+def copy_month(table_name, month, next_month, path):
+    """Grava o mês em CSV comprimido via COPY ... TO STDOUT, em streaming."""
+    query = (f'COPY (SELECT * FROM public.{table_name} WHERE {month_filter(month, next_month)} '
+             f'ORDER BY "timestamp", device) TO STDOUT WITH (FORMAT csv, HEADER)')
+
+    with gzip.open(path, 'wb') as out:
+        process = subprocess.Popen(psql_command('--command', query), env=psql_env(),
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        shutil.copyfileobj(process.stdout, out)
+        stderr = process.stderr.read().decode()
+        process.wait()
+
+    if process.returncode != 0:
+        logger.error(f"Falha no COPY de {table_name}: {stderr}")
+        return False
+    return True
+
+def count_archive_rows(path):
+    """Conta as linhas de um arquivo lendo-o em blocos."""
+    return sum(len(chunk) for chunk in pd.read_csv(path, compression='gzip', usecols=['timestamp'],
+                                                     chunksize=ARCHIVE_CHUNK_ROWS))
+
+def merge_archive(path, new_path):
+    """
+    Acrescenta ao arquivo novo as linhas do arquivo já existente que não
+    vieram do banco (execução anterior interrompida ou dados atrasados).
+
+    Retorna o número de linhas mantidas do arquivo existente.
+    """
+    columns = pd.read_csv(new_path, compression='gzip', nrows=0).columns
+    new_keys = pd.MultiIndex.from_frame(pd.read_csv(new_path, compression='gzip', usecols=['timestamp', 'device']))
+
+    kept = 0
+    with gzip.open(new_path, 'at', newline='') as out:
+        for chunk in pd.read_csv(path, compression='gzip', chunksize=ARCHIVE_CHUNK_ROWS):
+            chunk = chunk[~pd.MultiIndex.from_frame(chunk[['timestamp', 'device']]).isin(new_keys)]
+            chunk.reindex(columns=columns).to_csv(out, header=False, index=False)
+            kept += len(chunk)
+    return kept
+
+def write_archive(table_name, month, next_month):
+    """
+    Grava o arquivo do mês e confere a contagem relida do disco.
+
+    Retorna (linhas vindas do banco, colunas) ou None em caso de falha.
+    """
+    path = archive_path(table_name, month)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    tmp_path = path + '.tmp'
+    if not copy_month(table_name, month, next_month, tmp_path):
+        os.remove(tmp_path)
+        return None
+
+    copied = count_archive_rows(tmp_path)
+    if copied == 0:
+        os.remove(tmp_path)
+        return 0, []
+    columns = list(pd.read_csv(tmp_path, compression='gzip', nrows=0).columns)
+
+    kept = merge_archive(path, tmp_path) if os.path.exists(path) else 0
+    archived = count_archive_rows(tmp_path)
+    if archived != copied + kept:
+        os.remove(tmp_path)
+        logger.error(f"Arquivo {path} com {archived} linhas, esperado {copied + kept}")
+        return None
+
+    os.replace(tmp_path, path)
+    logger.info(f"Arquivo salvo: {path} ({archived} registros)")
+    return copied, columns
+
+def aggregate_and_delete(table_name, month, next_month, columns, archived_rows):
+    """
+    Grava as médias horárias por device em {table_name}_hourly e remove o mês
+    da tabela online, em uma única transação.
+
+    Se o número de linhas removidas diferir do que foi arquivado (linhas
+    inseridas ou removidas depois do COPY), a transação inteira é desfeita.
+    """
+    values = [column for column in columns if column not in ('timestamp', 'device')]
+    where = month_filter(month, next_month)
+    sql = f"""
+DO $$
+DECLARE deleted bigint;
+BEGIN
+  INSERT INTO public.{table_name}_hourly ("timestamp", device, {', '.join(f'"{c}"' for c in values)}, samples)
+  SELECT date_trunc('hour', "timestamp"), device, {', '.join(f'avg("{c}")' for c in values)}, count(*)
+  FROM public.{table_name} WHERE {where}
+  GROUP BY 1, 2
+  ON CONFLICT ("timestamp", device) DO UPDATE SET
+    {', '.join(f'"{c}" = EXCLUDED."{c}"' for c in values + ['samples'])};
+
+  DELETE FROM public.{table_name} WHERE {where};
+  GET DIAGNOSTICS deleted = ROW_COUNT;
+  IF deleted <> {archived_rows} THEN
+    RAISE EXCEPTION 'contagem divergente: banco=%, arquivo={archived_rows}', deleted;
+  END IF;
+END $$;
+"""
+    result = subprocess.run(psql_command('--command', sql), env=psql_env(),
+                            capture_output=True, text=True, timeout=3600)
+    if result.returncode != 0:
+        logger.error(f"Remoção cancelada em {table_name} {month.strftime('%Y-%m')}: {result.stderr.strip()}")
+        return False
+    return True
+
+def archive_month(table_name, month):
+    """Arquiva, verifica, agrega e remove um mês de dados brutos."""
+    next_month = month + pd.DateOffset(months=1)
+    logger.info(f"Arquivando {table_name} de {month.strftime('%Y-%m')}...")
+
+    try:
+        archived = write_archive(table_name, month, next_month)
+        if archived is None:
+            return False
+
+        archived_rows, columns = archived
+        if archived_rows == 0:
+            logger.info(f"Nenhum dado em {table_name} para {month.strftime('%Y-%m')}")
+            return True
+
+        if not aggregate_and_delete(table_name, month, next_month, columns, archived_rows):
+            return False
+        logger.info(f"{archived_rows} registros de {month.strftime('%Y-%m')} removidos de {table_name}")
+        return True
+
+    except Exception as e:
+        logger.error(f"Erro ao arquivar {table_name} {month.strftime('%Y-%m')}: {e}")
+        return False
+
+def read_measures(table_name, start, end, columns=None):
+    """
+    Lê medidas brutas com start <= timestamp < end.
+
+    Meses já arquivados são lidos dos arquivos comprimidos (em blocos, apenas
+    as colunas pedidas) e o restante do banco; o resultado é o mesmo
+    independente de onde os dados estão.
+    """
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    if columns is not None:
+        columns = ['timestamp', 'device'] + [c for c in columns if c not in ('timestamp', 'device')]
+    frames = []
+
+    for month in pd.date_range(start.replace(day=1).normalize(), end, freq='MS'):
+        path = archive_path(table_name, month)
+        if not os.path.exists(path):
+            continue
+        for chunk in pd.read_csv(path, compression='gzip', usecols=columns, chunksize=ARCHIVE_CHUNK_ROWS):
+            timestamps = pd.to_datetime(chunk['timestamp'])
+            frames.append(chunk[(timestamps >= start) & (timestamps < end)])
+
+    frames.append(fetch_range(table_name, start, end, ','.join(columns) if columns else '*'))
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame()
+
+    df = pd.concat(frames, ignore_index=True)
+    df['timestamp'] = pd.to_datetime(df['timestamp']).dt.strftime('%Y-%m-%d %H:%M:%S')
+    return df.drop_duplicates(subset=['timestamp', 'device'], keep='last').sort_values(['timestamp', 'device'])
+
+def main():
+    """Função principal de retenção."""
+    cutoff = get_cutoff()
+    logger.info(f"=== Iniciando retenção (dados brutos anteriores a {cutoff.date()}) ===")
+
+    success_count = 0
+    total_months = 0
+
+    for table in RETENTION_TABLES:
+        oldest = get_oldest_month(table)
+        if oldest is None or oldest >= cutoff:
+            logger.info(f"{table}: nada a arquivar")
+            continue
+
+        for month in pd.date_range(oldest, cutoff - timedelta(days=1), freq='MS'):
+            total_months += 1
+            if archive_month(table, month):
+                success_count += 1
+
+    logger.info(f"=== Retenção concluída: {success_count}/{total_months} meses arquivados ===")
+
+    return success_count == total_months
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -3,20 +3,29 @@
 Scheduler principal para sincronização diária de dados Sungrow com Supabase.
 
 Este script executa diariamente:
-1. Renovação do token Sungrow
-2. Download de dados do dia anterior (inverters, combiners, yield, fault logs)
+1. Obtenção do token Sungrow (cache local, renovado apenas quando necessário)
+2. Download de dados do dia anterior (inverters, combiners, yield, fault logs) em paralelo
 3. Inserção no Supabase com deduplicação
 4. Geração de CSVs anuais como backup
 """
 
 import os
 import sys
+import json
+import signal
+import argparse
+import threading
 import subprocess
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import pandas as pd
 from supabase import create_client, Client
+from token_manager import get_token, refresh_token, is_auth_error
+from completeness import (presence_matrix, expected_slots, missing_windows, merge_windows, slot_time, lookup,
+                          summarize, window_matrix)
+import string_analytics
 
 # Configuração de logging
 logging.basicConfig(
@@ -39,34 +48,65 @@ SUPABASE_KEY = os.getenv('SUPABASE_ANON_KEY', 'your_supabase_anon_key')
 # Inicializar cliente Supabase
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
-def renew_token():
-    """Renova o token Sungrow se necessário."""
-    logger.info("Renovando token Sungrow...")
-    try:
-        result = subprocess.run([sys.executable, 'login_script.py'],
-                              capture_output=True, text=True, timeout=60)
-        if result.returncode == 0:
-            logger.info("Token renovado com sucesso")
-            return True
-        else:
-            logger.error(f"Falha ao renovar token: {result.stderr}")
-            return False
-    except Exception as e:
-        logger.error(f"Erro ao executar login_script.py: {e}")
-        return False
+# Arquivos de cadastro usados para registrar devices novos
+DEVICES_CSV = 'devices.csv'
+POWER_STATIONS_CSV = 'power_stations.csv'
+
+# Cache em memória das chaves já cadastradas (carregado uma vez por execução)
+_known_devices = None
+_known_stations = None
+_placeholder_devices = None  # Devices cadastrados sem ps_id, a completar pelo CSV
+
+# Tabelas de 5 minutos e scripts de coleta correspondentes
+MEASURE_SOURCES = {
+    'inverter_measures': 'get_inverter_measures.py',
+    'combiner_measures': 'get_combiner_measures.py',
+}
+SYNC_INTERVAL_MINUTES = int(os.getenv('SYNC_INTERVAL_MINUTES', '5'))
+SYNC_LOOKBACK_HOURS = int(os.getenv('SYNC_LOOKBACK_HOURS', '48'))
+SYNC_CURSOR_FILE = os.getenv('SYNC_CURSOR_FILE', 'sync_cursors.json')
+SYNC_OVERLAP_MINUTES = int(os.getenv('SYNC_OVERLAP_MINUTES', '15'))
+RECONCILE_HOUR = int(os.getenv('RECONCILE_HOUR', '2'))
+
+# Detecção de lacunas: dias do índice usados para saber quais devices esperar
+# e distância máxima (em slots) para unir janelas ausentes em uma só busca
+COMPLETENESS_LOOKBACK_DAYS = int(os.getenv('COMPLETENESS_LOOKBACK_DAYS', '7'))
+GAP_MERGE_SLOTS = int(os.getenv('GAP_MERGE_SLOTS', '6'))
+# Dias em que lacunas abertas no índice voltam a ser rebuscadas a cada noite
+GAP_RETRY_DAYS = int(os.getenv('GAP_RETRY_DAYS', '7'))
+
+_stop_event = threading.Event()
 
 def run_script_with_date(script_name, start_date, end_date, date_format='timestamp'):
-    """Executa um script com datas específicas."""
+    """
+    Executa um script com datas específicas.
+
+    O token em cache é passado via variável TOKEN; se o script falhar por erro
+    de autenticação, o token é renovado (uma única vez entre scripts
+    concorrentes) e o script é executado novamente.
+    """
     logger.info(f"Executando {script_name} de {start_date} até {end_date}")
 
     cmd = [sys.executable, script_name, '--start', start_date, '--end', end_date]
 
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=3600)  # 1h timeout
-        if result.returncode == 0:
-            logger.info(f"{script_name} executado com sucesso")
-            return True
-        else:
+        token = get_token()
+        for attempt in range(2):
+            env = os.environ.copy()
+            if token:
+                env['TOKEN'] = token
+
+            result = subprocess.run(cmd, env=env, capture_output=True, text=True, timeout=3600)  # 1h timeout
+            if result.returncode == 0:
+                logger.info(f"{script_name} executado com sucesso")
+                return True
+
+            if attempt == 0 and is_auth_error(result.stdout + result.stderr):
+                logger.warning(f"Token rejeitado em {script_name}, renovando...")
+                token = refresh_token(token)
+                if token:
+                    continue
+
             logger.error(f"Falha em {script_name}: {result.stderr}")
             return False
     except subprocess.TimeoutExpired:
@@ -76,6 +116,212 @@ def run_script_with_date(script_name, start_date, end_date, date_format='timesta
         logger.error(f"Erro ao executar {script_name}: {e}")
         return False
 
+def fetch_column_values(table_name, column, null_column=None, page_size=1000):
+    """
+    Retorna o conjunto de valores de uma coluna, paginando a consulta.
+
+    Com `null_column`, apenas das linhas em que essa coluna é nula.
+    """
+    values = set()
+    start = 0
+    while True:
+        query = supabase.table(table_name).select(column)
+        if null_column:
+            query = query.is_(null_column, 'null')
+        result = (query.order(column)
+                  .range(start, start + page_size - 1).execute())
+        values.update(str(row[column]) for row in result.data)
+        if len(result.data) < page_size:
+            return values
+        start += page_size
+
+def load_device_registry():
+    """Carrega (uma vez) as chaves de devices e power_stations em memória."""
+    global _known_devices, _known_stations, _placeholder_devices
+
+    if _known_devices is None:
+        _known_devices = fetch_column_values('devices', 'ps_key')
+        _known_stations = fetch_column_values('power_stations', 'ps_id')
+        _placeholder_devices = fetch_column_values('devices', 'ps_key', null_column='ps_id')
+        logger.info(f"Cadastro carregado: {len(_known_devices)} devices ({len(_placeholder_devices)} sem ps_id), "
+                    f"{len(_known_stations)} power stations")
+
+    return _known_devices, _known_stations, _placeholder_devices
+
+def reset_device_registry():
+    """Descarta o cache do cadastro; a próxima verificação o recarrega do banco."""
+    global _known_devices
+    _known_devices = None
+
+def read_registry_csv(csv_file, key_column, keys):
+    """Lê do CSV de cadastro apenas as linhas cujas chaves estão em `keys`."""
+    if not os.path.exists(csv_file):
+        logger.warning(f"{csv_file} não encontrado")
+        return pd.DataFrame(columns=[key_column])
+
+    # Ler como texto para não transformar inteiros em float (ex.: 123 -> 123.0)
+    df = pd.read_csv(csv_file, dtype=str)
+    return df[df[key_column].isin(keys)].drop_duplicates(subset=[key_column])
+
+def to_records(df):
+    """Converte o DataFrame em registros, com NaN como None (null em JSON)."""
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+def ensure_devices_registered(df):
+    """
+    Garante que todos os devices do DataFrame existam em `devices` antes do upsert.
+
+    A verificação é vetorizada contra o cache em memória. Devices ausentes são
+    cadastrados em lote a partir de devices.csv/power_stations.csv; os que não
+    constam no CSV recebem um registro mínimo (apenas ps_key). Devices já
+    cadastrados sem ps_id são regravados a partir do CSV uma vez a cada
+    carga do cadastro (por execução; no daemon, a cada reconciliação diária),
+    o que completa os registros mínimos depois que o CSV é atualizado.
+    """
+    known_devices, known_stations, placeholder_devices = load_device_registry()
+
+    devices = pd.Series(df['device'].dropna().unique()).astype(str)
+    missing = devices[~devices.isin(known_devices)]
+    incomplete = devices[devices.isin(placeholder_devices)]
+    if missing.empty and incomplete.empty:
+        return True
+
+    if not missing.empty:
+        logger.warning(f"{len(missing)} devices ausentes no cadastro, registrando...")
+
+    try:
+        device_rows = read_registry_csv(DEVICES_CSV, 'ps_key', pd.concat([missing, incomplete]))
+
+        # Power stations referenciadas pelos devices novos
+        if 'ps_id' in device_rows.columns:
+            station_ids = device_rows['ps_id'].dropna()
+            new_stations = station_ids[~station_ids.isin(known_stations)].unique()
+            if len(new_stations) > 0:
+                station_rows = read_registry_csv(POWER_STATIONS_CSV, 'ps_id', new_stations)
+                if not station_rows.empty:
+                    supabase.table('power_stations').upsert(to_records(station_rows)).execute()
+                    known_stations.update(station_rows['ps_id'])
+                    logger.info(f"Registradas {len(station_rows)} power stations")
+
+                # Sem cadastro da estação, o device é registrado sem ps_id
+                orphan = ~device_rows['ps_id'].isin(known_stations)
+                device_rows.loc[orphan, 'ps_id'] = None
+
+        # NaN -> None só depois da atribuição acima (em colunas texto o None vira NaN)
+        records = to_records(device_rows)
+        unlisted = missing[~missing.isin(device_rows['ps_key'])]
+        records += [{'ps_key': key} for key in unlisted]
+        if len(unlisted) > 0:
+            logger.warning(f"Devices sem cadastro em {DEVICES_CSV}: {', '.join(unlisted)}")
+
+        # Devices sem ps_id só são tentados uma vez por carga do cadastro
+        placeholder_devices.difference_update(incomplete)
+        if not records:
+            return True
+
+        supabase.table('devices').upsert(records).execute()
+        known_devices.update(missing)
+        completed = incomplete[incomplete.isin(device_rows['ps_key'])]
+        logger.info(f"Registrados {len(records)} devices ({len(completed)} completados a partir de {DEVICES_CSV})")
+        return True
+
+    except Exception as e:
+        logger.error(f"Erro ao registrar devices: {e}")
+        return False
+
+def prepare_dataframe(df, unique_columns):
+    """Normaliza tipos, remove duplicatas da chave e troca NaN por None."""
+    # Converter tipos de dados conforme necessário e para strings JSON-serializáveis
+    for column in ['timestamp', 'recover_time']:
+        if column in df.columns:
+            df[column] = pd.to_datetime(df[column]).dt.strftime('%Y-%m-%d %H:%M:%S')
+    if 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d')
+
+    # Remover duplicatas da chave (um mesmo lote não pode atualizar a linha duas vezes)
+    if all(column in df.columns for column in unique_columns):
+        df = df.drop_duplicates(subset=unique_columns, keep='last')
+
+    # Substituir NaN por None (null em JSON)
+    return df.replace({float('nan'): None})
+
+def upsert_dataframe(table_name, df):
+    """Envia um DataFrame já preparado ao Supabase em lotes."""
+    # Cadastrar devices novos antes de enviar os lotes (evita falha de FK)
+    if 'device' in df.columns and not ensure_devices_registered(df):
+        return False
+
+    # Inserir em lotes para evitar timeout
+    batch_size = 1000
+    total_inserted = 0
+
+    for i in range(0, len(df), batch_size):
+        batch = df.iloc[i:i+batch_size]
+
+        # Converter para dict e inserir
+        records = batch.to_dict('records')
+
+        # Usar upsert para evitar duplicatas (usa chave primária composta automaticamente)
+        try:
+            result = supabase.table(table_name).upsert(records).execute()
+            total_inserted += len(records)
+            logger.info(f"Inseridos {len(records)} registros em {table_name} (lote {i//batch_size + 1})")
+        except Exception as e:
+            logger.error(f"Erro ao inserir lote em {table_name}: {e}")
+            return False
+
+    logger.info(f"Total inserido em {table_name}: {total_inserted}")
+    return True
+
+def fetch_existing_summaries(dates, devices, page_size=1000, max_devices=200):
+    """
+    Resumos já gravados em string_analytics_daily para (dates × devices).
+
+    Os devices são consultados em lotes de modo que cada resposta fique abaixo
+    do limite de linhas do PostgREST (e a URL do filtro não cresça demais).
+    """
+    batch_size = max(1, min(max_devices, page_size // len(dates)))
+    existing = {}
+    for i in range(0, len(devices), batch_size):
+        result = (supabase.table('string_analytics_daily').select('*')
+                  .in_('date', dates).in_('device', devices[i:i + batch_size]).execute())
+        existing.update(((row['date'], row['device']), row) for row in result.data)
+    return existing
+
+def update_string_analytics(table_name, df, merge_existing=False, previous=None):
+    """
+    Atualiza string_analytics_daily com o resumo por (date, device) do bloco ingerido.
+
+    Blocos com o dia inteiro substituem o resumo; deltas do daemon são
+    combinados com o resumo já gravado, ponderados pelas amostras, usando
+    `previous` (última linha gravada por device) como referência do valor
+    congelado. Falhas aqui são registradas, mas não interrompem a ingestão.
+    """
+    try:
+        summary = string_analytics.analyze(df, previous)
+        if summary.empty:
+            return True
+        records = summary.replace({float('nan'): None}).to_dict('records')
+
+        if merge_existing:
+            existing = fetch_existing_summaries(summary['date'].unique().tolist(),
+                                                summary['device'].unique().tolist())
+            records = [string_analytics.merge(existing[(r['date'], r['device'])], r)
+                       if (r['date'], r['device']) in existing else r for r in records]
+
+        computed_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        records = [dict(string_analytics.finalize(r), table_name=table_name, computed_at=computed_at)
+                   for r in records]
+        supabase.table('string_analytics_daily').upsert(records).execute()
+
+        flagged = sum(1 for r in records if r['zero_strings'] or r['flatlined_strings'])
+        logger.info(f"Análise de strings de {table_name}: {len(records)} device-dias, {flagged} com strings zeradas/congeladas")
+        return True
+
+    except Exception as e:
+        logger.error(f"Erro na análise de strings de {table_name}: {e}")
+        return False
+
 def insert_to_supabase(table_name, csv_file, unique_columns):
     """Insere dados no Supabase com deduplicação."""
     logger.info(f"Inserindo dados em {table_name}...")
@@ -87,35 +333,12 @@ def insert_to_supabase(table_name, csv_file, unique_columns):
             logger.info(f"CSV {csv_file} vazio, pulando inserção")
             return True
 
-        # Converter tipos de dados conforme necessário e para strings JSON-serializáveis
-        if 'timestamp' in df.columns:
-            df['timestamp'] = pd.to_datetime(df['timestamp']).dt.strftime('%Y-%m-%d %H:%M:%S')
-        if 'date' in df.columns:
-            df['date'] = pd.to_datetime(df['date']).dt.strftime('%Y-%m-%d')
-
-        # Substituir NaN por None (null em JSON)
-        df = df.replace({float('nan'): None})
-
-        # Inserir em lotes para evitar timeout
-        batch_size = 1000
-        total_inserted = 0
-
-        for i in range(0, len(df), batch_size):
-            batch = df.iloc[i:i+batch_size]
-
-            # Converter para dict e inserir
-            records = batch.to_dict('records')
-
-            # Usar upsert para evitar duplicatas (usa chave primária composta automaticamente)
-            try:
-                result = supabase.table(table_name).upsert(records).execute()
-                total_inserted += len(records)
-                logger.info(f"Inseridos {len(records)} registros em {table_name} (lote {i//batch_size + 1})")
-            except Exception as e:
-                logger.error(f"Erro ao inserir lote em {table_name}: {e}")
-                return False
+        df = prepare_dataframe(df, unique_columns)
+        if not upsert_dataframe(table_name, df):
+            return False
 
-        logger.info(f"Total inserido em {table_name}: {total_inserted}")
+        if table_name in MEASURE_SOURCES:
+            update_string_analytics(table_name, df)
         return True
 
     except Exception as e:
@@ -151,8 +374,296 @@ def generate_yearly_backup(table_name, year):
         logger.error(f"Erro ao gerar backup {table_name}_{year}: {e}")
         return False
 
+def fetch_time_range(table_name, columns, start, end, devices=None, page_size=1000):
+    """Retorna as linhas com start <= timestamp < end (opcionalmente só de `devices`), paginando a consulta."""
+    rows = []
+    offset = 0
+    while True:
+        query = supabase.table(table_name).select(columns).gte('timestamp', start).lt('timestamp', end)
+        if devices is not None:
+            query = query.in_('device', devices)
+        result = (query.order('timestamp').order('device')
+                  .range(offset, offset + page_size - 1).execute())
+        rows.extend(result.data)
+        if len(result.data) < page_size:
+            return rows
+        offset += page_size
+
+def fetch_previous_rows(table_name, table_cursors, devices):
+    """Linha gravada no cursor de cada device, referência para a análise do delta."""
+    by_timestamp = {}
+    for device in devices:
+        if device in table_cursors:
+            by_timestamp.setdefault(table_cursors[device], []).append(device)
+
+    rows = []
+    for timestamp, cursor_devices in by_timestamp.items():
+        result = (supabase.table(table_name).select('*')
+                  .eq('timestamp', timestamp).in_('device', cursor_devices).execute())
+        rows.extend(result.data)
+
+    df = pd.DataFrame(rows)
+    if not df.empty:
+        df['timestamp'] = pd.to_datetime(df['timestamp']).dt.strftime('%Y-%m-%d %H:%M:%S')
+    return df
+
+def load_cursors():
+    """Lê os cursores (último timestamp por tabela e device) do arquivo local."""
+    try:
+        with open(SYNC_CURSOR_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_cursors(cursors):
+    """Grava os cursores de forma atômica (legíveis só pelo dono)."""
+    tmp_file = SYNC_CURSOR_FILE + '.tmp'
+    with os.fdopen(os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+        json.dump(cursors, f, indent=2, sort_keys=True)
+    os.replace(tmp_file, SYNC_CURSOR_FILE)
+
+def bootstrap_cursors(table_name, since, until):
+    """Inicializa os cursores de uma tabela com o último timestamp gravado por device."""
+    rows = fetch_time_range(table_name, 'timestamp,device', since, until)
+    if not rows:
+        return {}
+
+    df = pd.DataFrame(rows)
+    df['timestamp'] = pd.to_datetime(df['timestamp']).dt.strftime('%Y-%m-%d %H:%M:%S')
+    return df.groupby('device')['timestamp'].max().to_dict()
+
+def sync_table(table_name, script_name, cursors, now):
+    """
+    Baixa a janela desde a última consulta bem-sucedida e insere apenas o delta.
+
+    A janela começa SYNC_OVERLAP_MINUTES antes da última consulta (ou do
+    cursor mais recente, na primeira execução), então o volume baixado
+    depende do intervalo e não do device mais atrasado. Devices atrasados
+    além da sobreposição ficam para a reconciliação e o reparo de lacunas.
+    """
+    floor = pd.Timestamp(now - timedelta(hours=SYNC_LOOKBACK_HOURS))
+    if table_name not in cursors:
+        cursors[table_name] = bootstrap_cursors(table_name, str(floor), now.strftime('%Y-%m-%d %H:%M:%S'))
+        logger.info(f"Cursores de {table_name} inicializados: {len(cursors[table_name])} devices")
+    table_cursors = cursors[table_name]
+    last_polls = cursors.setdefault('last_poll', {})
+
+    reference = last_polls.get(table_name) or max(table_cursors.values(), default=None)
+    since = floor
+    if reference:
+        since = max(floor, pd.Timestamp(reference) - timedelta(minutes=SYNC_OVERLAP_MINUTES))
+
+    # Os scripts de coleta trabalham com janelas dentro de um mesmo dia
+    for day in pd.date_range(since.normalize(), now, freq='D'):
+        window_start = max(since, day)
+        window_end = min(pd.Timestamp(now), day + timedelta(hours=23, minutes=55))
+        if window_start > window_end:
+            continue
+
+        if not run_script_with_date(script_name, window_start.strftime('%Y%m%d%H%M%S'),
+                                    window_end.strftime('%Y%m%d%H%M%S')):
+            return False
+
+        df = pd.read_csv(f'{table_name}.csv')
+        if df.empty:
+            continue
+        df = prepare_dataframe(df, ['timestamp', 'device'])
+
+        # Delta: linhas posteriores ao cursor do próprio device (vetorizado)
+        delta = df[df['timestamp'] > df['device'].map(table_cursors).fillna('')]
+        if delta.empty:
+            continue
+
+        if not upsert_dataframe(table_name, delta):
+            return False
+        previous = fetch_previous_rows(table_name, table_cursors, delta['device'].unique())
+        update_string_analytics(table_name, delta, merge_existing=True, previous=previous)
+
+        table_cursors.update(delta.groupby('device')['timestamp'].max().to_dict())
+        save_cursors(cursors)
+
+    last_polls[table_name] = now.strftime('%Y-%m-%d %H:%M:%S')
+    save_cursors(cursors)
+    return True
+
+def get_indexed_devices(table_name, day, page_size=1000):
+    """Devices com algum dado (present_slots > 0) no índice nos dias anteriores a `day`."""
+    since = (day - timedelta(days=COMPLETENESS_LOOKBACK_DAYS)).strftime('%Y-%m-%d')
+    devices = set()
+    offset = 0
+    while True:
+        result = (supabase.table('data_completeness').select('device')
+                  .eq('table_name', table_name).gte('date', since).lt('date', day.strftime('%Y-%m-%d'))
+                  .gt('present_slots', 0)
+                  .order('date').order('device')
+                  .range(offset, offset + page_size - 1).execute())
+        devices.update(row['device'] for row in result.data)
+        if len(result.data) < page_size:
+            return devices
+        offset += page_size
+
+def check_completeness(table_name, day):
+    """
+    Compara as chaves (timestamp, device) do dia com a grade de 5 minutos.
+
+    Grava a completude por device no índice data_completeness e retorna
+    (devices, matriz de presença), ou None se não houver devices esperados.
+    Devices que reportaram nos últimos COMPLETENESS_LOOKBACK_DAYS dias e
+    sumiram aparecem com 0%; depois disso deixam de ser esperados.
+    """
+    next_day = day + timedelta(days=1)
+    rows = pd.DataFrame(fetch_time_range(table_name, 'timestamp,device', str(day), str(next_day)),
+                        columns=['timestamp', 'device'])
+
+    devices = sorted(set(rows['device']) | get_indexed_devices(table_name, day))
+    if not devices:
+        logger.info(f"Nenhum device esperado em {table_name} para {day.date()}")
+        return None
+
+    present = presence_matrix(rows['timestamp'], rows['device'], day, devices)
+    summary = summarize(present, devices, day)
+    summary['date'] = day.strftime('%Y-%m-%d')
+    summary['table_name'] = table_name
+    summary['checked_at'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    supabase.table('data_completeness').upsert(summary.to_dict('records')).execute()
+
+    incomplete = summary[summary['completeness'] < 100]
+    logger.info(f"Completude de {table_name} em {day.date()}: {summary['completeness'].mean():.2f}% "
+                f"({len(incomplete)}/{len(devices)} devices com lacunas)")
+    return devices, present
+
+def get_open_gaps(table_name, since, until, page_size=1000):
+    """Lacunas abertas no índice (completude < 100%, device com dados) entre since e until."""
+    rows = []
+    offset = 0
+    while True:
+        result = (supabase.table('data_completeness').select('date,device,missing_windows')
+                  .eq('table_name', table_name).gte('date', since).lt('date', until)
+                  .lt('completeness', 100).gt('present_slots', 0)
+                  .order('date').order('device')
+                  .range(offset, offset + page_size - 1).execute())
+        rows.extend(result.data)
+        if len(result.data) < page_size:
+            return pd.DataFrame(rows, columns=['date', 'device', 'missing_windows'])
+        offset += page_size
+
+def fetch_missing(table_name, day, devices, missing):
+    """
+    Rebusca apenas as janelas ausentes do dia e insere só os slots que faltavam.
+
+    `missing` é a matriz device × slot dos slots ausentes, na ordem de
+    `devices`. Os scripts de coleta não filtram por device, então a busca é
+    limitada às janelas (unidas entre devices) e o filtro por device é feito
+    no upsert. A análise das strings dos devices reparados é recalculada com
+    o dia completo deles, já que as linhas inseridas no meio do dia mudam a
+    comparação com a amostra anterior.
+    """
+    windows = merge_windows(missing_windows(missing.any(axis=0)), max_gap=GAP_MERGE_SLOTS)
+    logger.info(f"{int(missing.sum())} slots ausentes em {table_name} em {day.date()}, "
+                f"{len(windows)} janelas a rebuscar")
+
+    repaired_devices = set()
+    for start, end in windows:
+        if not run_script_with_date(MEASURE_SOURCES[table_name],
+                                    slot_time(day, start).strftime('%Y%m%d%H%M%S'),
+                                    slot_time(day, end).strftime('%Y%m%d%H%M%S')):
+            return False
+
+        df = pd.read_csv(f'{table_name}.csv')
+        if df.empty:
+            continue
+        df = prepare_dataframe(df, ['timestamp', 'device'])
+
+        # Manter apenas as chaves (device, slot) que estavam ausentes
+        repaired = df[lookup(missing, df['timestamp'], df['device'], day, devices)]
+        if repaired.empty:
+            continue
+        if not upsert_dataframe(table_name, repaired):
+            return False
+        repaired_devices.update(repaired['device'])
+
+    if repaired_devices:
+        day_rows = pd.DataFrame(fetch_time_range(table_name, '*', day.strftime('%Y-%m-%d'),
+                                                 (day + timedelta(days=1)).strftime('%Y-%m-%d'),
+                                                 devices=sorted(repaired_devices)))
+        day_rows['timestamp'] = pd.to_datetime(day_rows['timestamp']).dt.strftime('%Y-%m-%d %H:%M:%S')
+        update_string_analytics(table_name, day_rows)
+    return True
+
+def repair_gaps(table_name, day):
+    """
+    Verifica a completude do dia e rebusca apenas as janelas ausentes.
+
+    Devices sem nenhum dado no dia (offline ou desativados) ficam registrados
+    com 0% no índice, mas não geram janelas: rebuscar o dia inteiro da frota
+    por causa deles não é proporcional ao que falta.
+    """
+    day = pd.Timestamp(day).normalize()
+    logger.info(f"Verificando lacunas de {table_name} em {day.date()}...")
+
+    try:
+        checked = check_completeness(table_name, day)
+        if checked is None:
+            return True
+        devices, present = checked
+
+        missing = ~present & expected_slots(present)
+        offline = ~present.any(axis=1)
+        if offline.any():
+            logger.warning(f"{int(offline.sum())} devices sem dados em {table_name} no dia, fora do reparo")
+            missing[offline] = False
+        if not missing.any():
+            return True
+
+        if not fetch_missing(table_name, day, devices, missing):
+            return False
+
+        # Atualizar o índice com o resultado do reparo
+        check_completeness(table_name, day)
+        return True
+
+    except Exception as e:
+        logger.error(f"Erro ao reparar lacunas de {table_name}: {e}")
+        return False
+
+def retry_open_gaps(table_name, until):
+    """
+    Rebusca as lacunas que continuam abertas no índice nos GAP_RETRY_DAYS dias
+    anteriores a `until`, usando apenas as janelas gravadas em missing_windows.
+
+    Cobre os dados que o Sungrow ainda não tinha na noite do primeiro reparo.
+    """
+    until = pd.Timestamp(until).normalize()
+    since = until - timedelta(days=GAP_RETRY_DAYS)
+
+    try:
+        gaps = get_open_gaps(table_name, since.strftime('%Y-%m-%d'), until.strftime('%Y-%m-%d'))
+        if gaps.empty:
+            return True
+        logger.info(f"{len(gaps)} lacunas abertas em {table_name} desde {since.date()}, rebuscando...")
+
+        for date, group in gaps.groupby('date'):
+            day = pd.Timestamp(date)
+            devices = group['device'].tolist()
+            missing = window_matrix(group['missing_windows'], day)
+            if not missing.any():
+                continue
+            if not fetch_missing(table_name, day, devices, missing):
+                return False
+            check_completeness(table_name, day)
+        return True
+
+    except Exception as e:
+        logger.error(f"Erro ao rebuscar lacunas abertas de {table_name}: {e}")
+        return False
+
 def main():
-    """Função principal do scheduler."""
+    """
+    Função principal do scheduler.
+
+    Sincroniza o dia D-2 inteiro. No modo daemon funciona como reconciliação
+    diária da janela de dados que o Sungrow entrega com atraso.
+    """
     logger.info("=== Iniciando scheduler diário ===")
 
     # Calcular datas do dia anterior
@@ -164,41 +675,34 @@ def main():
     success_count = 0
     total_steps = 10
 
-    # 1. Renovar token
-    if renew_token():
-        success_count += 1
-        logger.info("✓ Token renovado")
-    else:
-        logger.error("✗ Falha na renovação do token")
-        return False
+    # Recarregar o cadastro (no daemon, uma vez por dia) para completar devices sem ps_id
+    reset_device_registry()
 
-    # 2. Baixar dados de inverters
-    if run_script_with_date('get_inverter_measures.py', yesterday_start, yesterday_end):
+    # 1. Obter token (reutiliza o cache; login apenas se expirado)
+    if get_token():
         success_count += 1
-        logger.info("✓ Dados de inverters baixados")
+        logger.info("✓ Token disponível")
     else:
-        logger.error("✗ Falha no download de inverters")
-
-    # 3. Baixar dados de combiners
-    if run_script_with_date('get_combiner_measures.py', yesterday_start, yesterday_end):
-        success_count += 1
-        logger.info("✓ Dados de combiners baixados")
-    else:
-        logger.error("✗ Falha no download de combiners")
+        logger.error("✗ Nenhum token Sungrow disponível")
+        return False
 
-    # 4. Baixar dados de yield
-    if run_script_with_date('get_yield_daily.py', yesterday_str, yesterday_str):
-        success_count += 1
-        logger.info("✓ Dados de yield baixados")
-    else:
-        logger.error("✗ Falha no download de yield")
+    # 2-5. Baixar inverters, combiners, yield e fault alarms em paralelo
+    downloads = [
+        ('get_inverter_measures.py', yesterday_start, yesterday_end, 'inverters'),
+        ('get_combiner_measures.py', yesterday_start, yesterday_end, 'combiners'),
+        ('get_yield_daily.py', yesterday_str, yesterday_str, 'yield'),
+        ('get_fault_alarms.py', yesterday_start, yesterday_end, 'fault alarms'),
+    ]
+    with ThreadPoolExecutor(max_workers=len(downloads)) as executor:
+        futures = [(executor.submit(run_script_with_date, script, start, end), label)
+                   for script, start, end, label in downloads]
 
-    # 5. Baixar dados de fault alarms
-    if run_script_with_date('get_fault_alarms.py', yesterday_start, yesterday_end):
-        success_count += 1
-        logger.info("✓ Dados de fault alarms baixados")
-    else:
-        logger.error("✗ Falha no download de fault alarms")
+        for future, label in futures:
+            if future.result():
+                success_count += 1
+                logger.info(f"✓ Dados de {label} baixados")
+            else:
+                logger.error(f"✗ Falha no download de {label}")
 
     # 6. Inserir inverters no Supabase
     if insert_to_supabase('inverter_measures', 'inverter_measures.csv', ['timestamp', 'device']):
@@ -222,12 +726,21 @@ def main():
         logger.error("✗ Falha na inserção de yield")
 
     # 9. Inserir fault alarms no Supabase
-    if insert_to_supabase('fault_alarms', 'fault_alarms.csv', ['timestamp', 'device']):
+    if insert_to_supabase('fault_alarms', 'fault_alarms.csv', ['device', 'fault_code', 'timestamp']):
         success_count += 1
         logger.info("✓ Dados de fault alarms inseridos no Supabase")
     else:
         logger.error("✗ Falha na inserção de fault alarms")
 
+    # Verificar completude do dia e rebuscar apenas as janelas ausentes, dele e
+    # das lacunas ainda abertas nos dias anteriores
+    # (não conta em total_steps, para não alterar a condição dos backups anuais)
+    if all([repair_gaps(table_name, yesterday.date()) for table_name in MEASURE_SOURCES] +
+           [retry_open_gaps(table_name, yesterday.date()) for table_name in MEASURE_SOURCES]):
+        logger.info("✓ Completude verificada e lacunas reparadas")
+    else:
+        logger.error("✗ Falha na verificação de lacunas")
+
     # 10. Gerar backups anuais (opcional, executado apenas se todos os passos anteriores passaram)
     if success_count == total_steps:
         current_year = datetime.now().year
@@ -241,6 +754,45 @@ def main():
 
     return success_count == total_steps
 
+def run_daemon():
+    """Mantém um único processo (e cliente Supabase) sincronizando a cada intervalo."""
+    logger.info(f"=== Iniciando daemon de sincronização (intervalo: {SYNC_INTERVAL_MINUTES} min) ===")
+    signal.signal(signal.SIGTERM, lambda *args: _stop_event.set())
+
+    cursors = load_cursors()
+    last_reconcile = None
+
+    while not _stop_event.is_set():
+        now = datetime.now()
+
+        for table_name, script_name in MEASURE_SOURCES.items():
+            try:
+                if not sync_table(table_name, script_name, cursors, now):
+                    logger.error(f"✗ Falha na sincronização incremental de {table_name}")
+            except Exception as e:
+                logger.error(f"Erro na sincronização de {table_name}: {e}")
+
+        # Reconciliação diária (dia D-2) para os dados atrasados do Sungrow
+        if now.hour >= RECONCILE_HOUR and last_reconcile != now.date():
+            main()
+            last_reconcile = now.date()
+
+        _stop_event.wait(SYNC_INTERVAL_MINUTES * 60)
+
+    logger.info("=== Daemon de sincronização finalizado ===")
+    return True
+
 if __name__ == "__main__":
-    success = main()
+    parser = argparse.ArgumentParser(description='Sincronização de dados Sungrow com Supabase')
+    parser.add_argument('--daemon', action='store_true',
+                        help='Executa continuamente, sincronizando dados de 5 minutos a cada intervalo')
+    parser.add_argument('--check-gaps', metavar='YYYYMMDD',
+                        help='Verifica a completude do dia e rebusca apenas as janelas ausentes')
+    args = parser.parse_args()
+
+    if args.check_gaps:
+        day = datetime.strptime(args.check_gaps, '%Y%m%d')
+        success = all([repair_gaps(table_name, day) for table_name in MEASURE_SOURCES])
+    else:
+        success = run_daemon() if args.daemon else main()
     sys.exit(0 if success else 1)
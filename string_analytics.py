@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Análise de desempenho das strings calculada na ingestão.
+
+Para cada bloco de medidas (inverter_measures ou combiner_measures) calcula,
+com operações vetorizadas sobre todas as strings e devices de uma vez:
+- razão da corrente de cada string pela mediana das strings do device
+- fração das amostras diurnas com string zerada ou com valor congelado
+- dispersão (máx - mín) das tensões dos MPPTs
+
+O resultado é um resumo por (date, device), gravado em string_analytics_daily.
+"""
+
+import re
+import warnings
+import numpy as np
+import pandas as pd
+
+MIN_STRING_CURRENT = 0.5   # Mediana mínima (A) para a amostra contar como diurna
+ZERO_CURRENT = 0.1         # Corrente (A) considerada zero
+ZERO_FRACTION = 0.8        # Fração diurna zerada para marcar a string
+FLATLINE_FRACTION = 0.8    # Fração diurna sem variação para marcar a string
+MIN_MPPT_VOLTAGE = 50.0    # MPPTs abaixo desta tensão (V) ficam fora da dispersão
+
+STRING_PATTERN = re.compile(r'^(?:string_(\d+)_current|ipv_(\d+))$')
+MPPT_PATTERN = re.compile(r'^mppt(\d+)_voltage$')
+
+def _matching_columns(columns, pattern):
+    """Colunas que casam com o padrão, em ordem numérica."""
+    matches = [(int(next(g for g in m.groups() if g)), c) for c in columns if (m := pattern.match(c))]
+    return [column for _, column in sorted(matches)]
+
+def _group_dicts(frame, keys, valid):
+    """Média por grupo de cada coluna, como dict {coluna: valor} sem NaN."""
+    grouped = frame.groupby(keys).mean().where(valid)
+    return [{column: round(float(value), 3) for column, value in row.items() if pd.notna(value)}
+            for _, row in grouped.iterrows()], grouped.index
+
+def analyze(df, previous=None):
+    """
+    Resume um bloco de medidas por (date, device).
+
+    `previous` traz a última linha já gravada de cada device antes do bloco
+    (deltas do daemon): serve apenas de referência para o valor congelado da
+    primeira amostra do bloco e não entra nas contagens.
+
+    Retorna DataFrame com samples (amostras diurnas), string_ratio,
+    zero_fraction, flat_fraction (dicts por string) e a dispersão dos MPPTs.
+    """
+    string_columns = _matching_columns(df.columns, STRING_PATTERN)
+    if not string_columns or df.empty:
+        return pd.DataFrame()
+
+    df = df.assign(_counted=True)
+    if previous is not None and not previous.empty:
+        reference = previous[previous['device'].isin(df['device'])].reindex(columns=df.columns)
+        df = pd.concat([reference.assign(_counted=False), df], ignore_index=True)
+    df = df.sort_values(['device', 'timestamp'])
+    values = df[string_columns].to_numpy(dtype=float)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # Linhas sem nenhuma string (noite)
+        median = np.nanmedian(values, axis=1)
+    daylight = median > MIN_STRING_CURRENT
+
+    # Valor repetido em relação à amostra anterior do mesmo device
+    device = df['device'].to_numpy()
+    flat = np.zeros(values.shape, dtype=bool)
+    flat[1:] = (values[1:] == values[:-1]) & (device[1:] == device[:-1])[:, None] & (values[1:] > ZERO_CURRENT)
+    flat &= daylight[:, None]
+
+    # Linhas de referência (previous) saem daqui em diante
+    counted = df['_counted'].to_numpy(dtype=bool)
+    df, values, daylight, median, flat = df[counted], values[counted], daylight[counted], median[counted], flat[counted]
+    keys = [df['timestamp'].astype(str).str[:10].to_numpy(), df['device'].to_numpy()]
+
+    ratio = values / np.where(daylight, median, np.nan)[:, None]
+    zero = (values <= ZERO_CURRENT) & daylight[:, None]
+
+    # String instalada: tem ao menos uma leitura no grupo
+    installed = pd.DataFrame(~np.isnan(values), columns=string_columns).groupby(keys).any()
+    daylight_samples = pd.Series(daylight).groupby(keys).sum()
+    has_daylight = installed & (daylight_samples > 0).to_numpy()[:, None]
+
+    # Frações calculadas apenas sobre as amostras diurnas
+    zero = np.where(daylight[:, None], zero, np.nan)
+    flat = np.where(daylight[:, None], flat, np.nan)
+
+    string_ratio, index = _group_dicts(pd.DataFrame(ratio, columns=string_columns), keys, has_daylight)
+    zero_fraction, _ = _group_dicts(pd.DataFrame(zero, columns=string_columns), keys, has_daylight)
+    flat_fraction, _ = _group_dicts(pd.DataFrame(flat, columns=string_columns), keys, has_daylight)
+
+    summary = pd.DataFrame({
+        'date': index.get_level_values(0),
+        'device': index.get_level_values(1),
+        'samples': daylight_samples.to_numpy().astype(int),
+        'string_ratio': string_ratio,
+        'zero_fraction': zero_fraction,
+        'flat_fraction': flat_fraction,
+    })
+
+    mppt_columns = _matching_columns(df.columns, MPPT_PATTERN)
+    spread = np.full(len(df), np.nan)
+    if len(mppt_columns) > 1:
+        voltages = df[mppt_columns].to_numpy(dtype=float, copy=True)
+        voltages[voltages < MIN_MPPT_VOLTAGE] = np.nan
+        valid = (~np.isnan(voltages)).sum(axis=1) >= 2
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            spread[valid] = np.nanmax(voltages[valid], axis=1) - np.nanmin(voltages[valid], axis=1)
+
+    spread_groups = pd.Series(spread).groupby(keys)
+    summary['mppt_spread_mean'] = spread_groups.mean().round(2).to_numpy()
+    summary['mppt_spread_max'] = spread_groups.max().round(2).to_numpy()
+    summary['spread_samples'] = spread_groups.count().to_numpy().astype(int)
+    return summary
+
+def _weighted(old, new, old_weight, new_weight):
+    """Média ponderada de dois dicts por string."""
+    merged = {}
+    for column in set(old) | set(new):
+        weights = [(old.get(column), old_weight), (new.get(column), new_weight)]
+        weights = [(value, weight) for value, weight in weights if value is not None and weight]
+        total = sum(weight for _, weight in weights)
+        if total:
+            merged[column] = round(sum(value * weight for value, weight in weights) / total, 3)
+    return merged
+
+def merge(old, new):
+    """
+    Combina um resumo já gravado (dict) com o de um bloco novo do mesmo dia.
+
+    Usado quando o bloco é um delta do daemon, posterior às amostras já
+    resumidas (ver `previous` em analyze).
+    """
+    old_samples, new_samples = old.get('samples') or 0, new['samples']
+    merged = dict(new)
+    merged['samples'] = old_samples + new_samples
+    for column in ['string_ratio', 'zero_fraction', 'flat_fraction']:
+        merged[column] = _weighted(old.get(column) or {}, new[column], old_samples, new_samples)
+
+    old_spread, new_spread = old.get('spread_samples') or 0, new['spread_samples']
+    merged['spread_samples'] = old_spread + new_spread
+    if old_spread and new_spread:
+        merged['mppt_spread_mean'] = round((old['mppt_spread_mean'] * old_spread +
+                                            new['mppt_spread_mean'] * new_spread) / (old_spread + new_spread), 2)
+        merged['mppt_spread_max'] = max(old['mppt_spread_max'], new['mppt_spread_max'])
+    elif old_spread:
+        merged['mppt_spread_mean'] = old['mppt_spread_mean']
+        merged['mppt_spread_max'] = old['mppt_spread_max']
+    return merged
+
+def finalize(record):
+    """Deriva a pior string e as listas de strings zeradas/congeladas."""
+    ratios = record['string_ratio']
+    worst = min(ratios, key=ratios.get) if ratios else None
+    record['worst_string'] = worst
+    record['min_string_ratio'] = ratios[worst] if worst else None
+    record['zero_strings'] = sorted(s for s, f in record['zero_fraction'].items() if f >= ZERO_FRACTION)
+    record['flatlined_strings'] = sorted(s for s, f in record['flat_fraction'].items() if f >= FLATLINE_FRACTION)
+    return record
@@ -1,9 +1,19 @@
 #!/usr/bin/env python3
 """
 Script para testar conexão com Supabase local
+
+Além da conexão e do acesso às tabelas, mede a latência (p50/p95/p99) de
+leituras representativas e a vazão de upsert de cada tabela, comparando com
+a linha de base salva em PERF_BASELINE_FILE. Sai com código 1 em caso de
+falha ou regressão.
 """
 
 import os
+import sys
+import json
+import time
+import argparse
+from datetime import date, datetime, timedelta
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
@@ -13,6 +23,28 @@ load_dotenv()
 SUPABASE_URL = os.getenv('SUPABASE_URL', 'http://localhost:8000')
 SUPABASE_KEY = os.getenv('SUPABASE_ANON_KEY')
 
+PERF_BASELINE_FILE = os.getenv('PERF_BASELINE_FILE', 'perf_baselines.json')
+PERF_TOLERANCE = float(os.getenv('PERF_TOLERANCE', '1.5'))  # Regressão: p95 > linha de base × tolerância
+PERF_SLACK_MS = float(os.getenv('PERF_SLACK_MS', '20'))     # Folga absoluta para ruído em consultas rápidas
+WRITE_SAMPLE_ROWS = 500
+
+# Chaves reservadas para as linhas sintéticas do teste de escrita; dados reais
+# nunca caem nelas (ps_id negativo, ps_key com prefixo, datas anteriores a 1910)
+PROBE_PS_ID_START = -1
+PROBE_PS_KEY_PREFIX = 'perf-probe-'
+PROBE_TIME_START = datetime(1900, 1, 1)
+PROBE_TIME_END = '1910-01-01'
+
+# Chave primária e coluna de tempo de cada tabela testada
+PROBE_TABLES = {
+    'power_stations': {'key': ['ps_id'], 'time': None},
+    'devices': {'key': ['ps_key'], 'time': None},
+    'inverter_measures': {'key': ['timestamp', 'device'], 'time': 'timestamp'},
+    'combiner_measures': {'key': ['timestamp', 'device'], 'time': 'timestamp'},
+    'yield_daily': {'key': ['date', 'device'], 'time': 'date'},
+    'fault_alarms': {'key': ['device', 'fault_code', 'timestamp'], 'time': 'timestamp'},
+}
+
 def test_connection():
     """Testa conexão básica com Supabase"""
     try:
@@ -34,10 +66,11 @@ def test_connection():
 
 def test_tables():
     """Testa se as tabelas existem e têm a estrutura correta"""
+    success = True
     try:
         supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
         
-        tables = ['power_stations', 'devices', 'inverter_measures', 'combiner_measures', 'yield_daily']
+        tables = ['power_stations', 'devices', 'inverter_measures', 'combiner_measures', 'yield_daily', 'fault_alarms']
         
         for table in tables:
             try:
@@ -46,16 +79,191 @@ def test_tables():
                 print(f"✅ Tabela '{table}' acessível")
             except Exception as e:
                 print(f"❌ Erro na tabela '{table}': {e}")
+                success = False
                 
     except Exception as e:
         print(f"❌ Erro geral: {e}")
+        success = False
+
+    return success
+
+def percentile(values, pct):
+    """Percentil pelo método do posto mais próximo."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def measure_latency(query, iterations):
+    """Executa a consulta `iterations` vezes e retorna p50/p95/p99 em ms."""
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        query().execute()
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return {f'p{pct}': round(percentile(latencies, pct), 2) for pct in (50, 95, 99)}
+
+def month_bounds(day):
+    """Primeiro dia do mês de `day` e do mês seguinte (YYYY-MM-DD)."""
+    first = date.fromisoformat(day[:10]).replace(day=1)
+    next_first = (first + timedelta(days=32)).replace(day=1)
+    return first.isoformat(), next_first.isoformat()
+
+def probe_rows(table, time_column, template):
+    """
+    Linhas sintéticas para o teste de escrita, copiadas de `template` com a
+    chave trocada por uma chave reservada (o device real é mantido por causa
+    da chave estrangeira).
+    """
+    rows = []
+    for i in range(WRITE_SAMPLE_ROWS):
+        row = dict(template)
+        if table == 'power_stations':
+            row['ps_id'] = PROBE_PS_ID_START - i
+        elif table == 'devices':
+            row['ps_key'] = f'{PROBE_PS_KEY_PREFIX}{i}'
+            row['ps_id'] = None
+        elif time_column == 'date':
+            row['date'] = (PROBE_TIME_START + timedelta(days=i)).strftime('%Y-%m-%d')
+        else:
+            row[time_column] = (PROBE_TIME_START + timedelta(minutes=i)).strftime('%Y-%m-%d %H:%M:%S')
+        rows.append(row)
+    return rows
+
+def delete_probe_rows(supabase, table, time_column):
+    """Remove as linhas sintéticas (inclusive as de execuções interrompidas)."""
+    query = supabase.table(table).delete()
+    if table == 'power_stations':
+        query = query.lte('ps_id', PROBE_PS_ID_START)
+    elif table == 'devices':
+        query = query.like('ps_key', f'{PROBE_PS_KEY_PREFIX}%')
+    else:
+        query = query.lt(time_column, PROBE_TIME_END)
+    query.execute()
+
+def probe_table(supabase, table, spec, iterations):
+    """
+    Mede as leituras representativas e a vazão de escrita de uma tabela.
+
+    A escrita grava linhas sintéticas em chaves reservadas e as remove em
+    seguida, de modo que o teste não modifica os dados reais.
+    """
+    key, time_column = spec['key'], spec['time']
+
+    sample_rows = (supabase.table(table).select('*')
+                   .order(time_column or key[0], desc=True).limit(1).execute().data)
+    if not sample_rows:
+        print(f"⚠️  Tabela '{table}' vazia, medição ignorada")
+        return {}
+
+    sample = sample_rows[0]
+    results = {}
+
+    # Consulta pontual pela chave primária
+    def point_lookup():
+        query = supabase.table(table).select('*')
+        for column in key:
+            query = query.eq(column, sample[column])
+        return query
+    results['point_lookup'] = measure_latency(point_lookup, iterations)
+
+    if time_column and 'device' in sample:
+        day = sample[time_column][:10]
+        next_day = (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+        month_start, next_month = month_bounds(day)
+
+        # Um device em um dia
+        results['device_day'] = measure_latency(
+            lambda: supabase.table(table).select('*').eq('device', sample['device'])
+                    .gte(time_column, day).lt(time_column, next_day),
+            iterations)
+
+        # Agregado (contagem) de um mês inteiro
+        results['month_aggregate'] = measure_latency(
+            lambda: supabase.table(table).select(time_column, count='exact')
+                    .gte(time_column, month_start).lt(time_column, next_month).limit(1),
+            iterations)
+
+    rows = probe_rows(table, time_column, sample)
+    try:
+        start = time.perf_counter()
+        supabase.table(table).upsert(rows).execute()
+        results['upsert_rows_per_s'] = round(len(rows) / (time.perf_counter() - start), 1)
+    finally:
+        delete_probe_rows(supabase, table, time_column)
+
+    for metric, value in results.items():
+        print(f"   {table}.{metric}: {value}")
+
+    return results
+
+def find_regressions(results, baseline):
+    """Compara o resultado com a linha de base; retorna a lista de regressões."""
+    regressions = []
+    for table, metrics in results.items():
+        for metric, value in metrics.items():
+            expected = baseline.get(table, {}).get(metric)
+            if expected is None:
+                continue
+
+            if metric == 'upsert_rows_per_s':
+                if value < expected / PERF_TOLERANCE:
+                    regressions.append(f"{table}.{metric}: {value} linhas/s (base {expected})")
+            elif value['p95'] > expected['p95'] * PERF_TOLERANCE + PERF_SLACK_MS:
+                regressions.append(f"{table}.{metric}: p95 {value['p95']} ms (base {expected['p95']} ms)")
+
+    return regressions
+
+def test_performance(iterations, update_baseline=False):
+    """Mede todas as tabelas e verifica regressões contra a linha de base."""
+    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+    results = {}
+    for table, spec in PROBE_TABLES.items():
+        try:
+            print(f"⏱️  Medindo '{table}'...")
+            results[table] = probe_table(supabase, table, spec, iterations)
+        except Exception as e:
+            print(f"❌ Erro ao medir '{table}': {e}")
+            return False
+
+    if update_baseline or not os.path.exists(PERF_BASELINE_FILE):
+        with os.fdopen(os.open(PERF_BASELINE_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Linha de base salva em {PERF_BASELINE_FILE}")
+        return True
+
+    with open(PERF_BASELINE_FILE) as f:
+        baseline = json.load(f)
+
+    regressions = find_regressions(results, baseline)
+    if regressions:
+        print("\n❌ Regressões de desempenho:")
+        for regression in regressions:
+            print(f"   {regression}")
+        return False
+
+    print("\n✅ Desempenho dentro da linha de base")
+    return True
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Teste de conexão e desempenho do Supabase')
+    parser.add_argument('--iterations', type=int, default=20, help='Repetições de cada consulta medida')
+    parser.add_argument('--update-baseline', action='store_true', help='Salva o resultado atual como linha de base')
+    parser.add_argument('--skip-perf', action='store_true', help='Apenas testa conexão e tabelas')
+    args = parser.parse_args()
+
     print("=== Teste de Conexão Supabase ===\n")
     
     if test_connection():
         print("\n=== Teste de Tabelas ===\n")
-        test_tables()
+        success = test_tables()
+
+        if success and not args.skip_perf:
+            print("\n=== Teste de Desempenho ===\n")
+            success = test_performance(args.iterations, args.update_baseline)
+
+        sys.exit(0 if success else 1)
     else:
         print("\n=== Instruções para resolver ===\n")
         print("1. Verificar se o Docker está rodando:")
@@ -76,3 +284,4 @@ if __name__ == "__main__":
         print("5. Verificar arquivo .env:")
         print("   cat /opt/sungrow-sync/.env")
         print("   # SUPABASE_URL deve ser http://localhost:54321")
+        sys.exit(1)
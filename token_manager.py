@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Gerenciador do token Sungrow com cache local.
+
+O token é salvo em TOKEN_CACHE_FILE junto com sua validade e reutilizado
+enquanto não estiver perto de expirar. A renovação é preguiçosa: só acontece
+quando o token expirou ou quando a API responde com erro de autenticação.
+Chamadas concorrentes (threads ou processos) compartilham uma única renovação.
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import subprocess
+import threading
+from dotenv import load_dotenv, dotenv_values
+
+try:
+    import fcntl
+except ImportError:  # Windows: apenas o lock entre threads é usado
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Carregar variáveis de ambiente
+load_dotenv()
+
+TOKEN_CACHE_FILE = os.getenv('TOKEN_CACHE_FILE', '.token_cache.json')
+TOKEN_TTL_HOURS = float(os.getenv('TOKEN_TTL_HOURS', '24'))
+TOKEN_REFRESH_MARGIN = 600  # Renovar 10 min antes da expiração
+
+# Trechos que identificam erro de autenticação na saída dos scripts de coleta
+AUTH_ERROR_MARKERS = ('er_token_login_invalid', 'token invalid', 'token expired', 'E00003')
+
+_refresh_lock = threading.Lock()
+
+class _FileLock:
+    """Lock exclusivo entre processos sobre o arquivo de cache."""
+
+    def __enter__(self):
+        self.handle = open(TOKEN_CACHE_FILE + '.lock', 'w')
+        if fcntl is not None:
+            fcntl.flock(self.handle, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self.handle, fcntl.LOCK_UN)
+        self.handle.close()
+
+def _read_cache():
+    """Lê o cache; retorna dict com token/expires_at ou None."""
+    try:
+        with open(TOKEN_CACHE_FILE) as f:
+            cache = json.load(f)
+        if cache.get('token'):
+            return cache
+    except (OSError, ValueError):
+        pass
+    return None
+
+def _write_cache(token):
+    """Grava o token com a validade calculada (escrita atômica, legível só pelo dono)."""
+    cache = {'token': token, 'expires_at': time.time() + TOKEN_TTL_HOURS * 3600}
+    tmp_file = TOKEN_CACHE_FILE + '.tmp'
+    with os.fdopen(os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+        json.dump(cache, f)
+    os.replace(tmp_file, TOKEN_CACHE_FILE)
+    return cache
+
+def _is_valid(cache):
+    return cache is not None and cache['expires_at'] - TOKEN_REFRESH_MARGIN > time.time()
+
+def _login():
+    """Executa login_script.py e retorna o novo TOKEN gravado no .env."""
+    logger.info("Renovando token Sungrow...")
+    try:
+        result = subprocess.run([sys.executable, 'login_script.py'],
+                              capture_output=True, text=True, timeout=60)
+        if result.returncode != 0:
+            logger.error(f"Falha ao renovar token: {result.stderr}")
+            return None
+    except Exception as e:
+        logger.error(f"Erro ao executar login_script.py: {e}")
+        return None
+
+    token = dotenv_values('.env').get('TOKEN')
+    if not token:
+        logger.error("login_script.py não gravou TOKEN no .env")
+        return None
+
+    logger.info("Token renovado com sucesso")
+    return token
+
+def get_token():
+    """Retorna um token válido, renovando apenas se o cache estiver expirado."""
+    cache = _read_cache()
+    if _is_valid(cache):
+        return cache['token']
+
+    if cache is None and os.getenv('TOKEN'):
+        # Primeira execução: adotar o TOKEN do .env sem login; se estiver
+        # inválido, o erro de autenticação dispara a renovação
+        with _refresh_lock, _FileLock():
+            if _read_cache() is None:
+                _write_cache(os.getenv('TOKEN'))
+        return get_token()
+
+    return refresh_token(cache['token'] if cache else None)
+
+def refresh_token(stale_token):
+    """
+    Renova o token após `stale_token` ser rejeitado ou expirar.
+
+    Se outra thread/processo já renovou enquanto esperávamos o lock, o token
+    novo é reutilizado sem um segundo login.
+    """
+    with _refresh_lock, _FileLock():
+        cache = _read_cache()
+        if _is_valid(cache) and cache['token'] != stale_token:
+            return cache['token']
+
+        token = _login()
+        if token is None:
+            return None
+        return _write_cache(token)['token']
+
+def is_auth_error(output):
+    """Indica se a saída de um script de coleta contém erro de autenticação."""
+    output = (output or '').lower()
+    return any(marker.lower() in output for marker in AUTH_ERROR_MARKERS)